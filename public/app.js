@@ -113,7 +113,7 @@ async function sendMessage() {
     sendBtn.innerHTML = '<span class="loading"></span>';
 
     try {
-        const response = await fetch(`${API_BASE}/api/chat`, {
+        const response = await fetch(`${API_BASE}/api/chat/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -121,16 +121,49 @@ async function sendMessage() {
             body: JSON.stringify({ question }),
         });
 
-        const data = await response.json();
+        if (!response.ok) {
+            const data = await response.json();
+            addMessage('bot', `❌ Error: ${data.message}`);
+            return;
+        }
 
-        if (data.success) {
-            let sourcesText = '';
-            if (data.data.sources && data.data.sources.length > 0) {
-                sourcesText = `<div class="sources">Source: ${data.data.sources.length} relevant passages from "${data.data.sources[0].metadata.filename}"</div>`;
+        // Hiển thị câu trả lời ngay khi từng token được stream về (NDJSON)
+        const messageDiv = addMessage('bot', '');
+        const answerSpan = document.createElement('span');
+        messageDiv.appendChild(answerSpan);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let sources = [];
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+
+                if (event.type === 'sources') {
+                    sources = event.sources;
+                } else if (event.type === 'token') {
+                    answerSpan.textContent += event.token;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event.type === 'error') {
+                    answerSpan.textContent += `${answerSpan.textContent ? '\n\n' : ''}❌ Error: ${event.message}`;
+                } else if (event.type === 'done' && sources.length > 0) {
+                    const sourcesDiv = document.createElement('div');
+                    sourcesDiv.className = 'sources';
+                    sourcesDiv.textContent = `Source: ${sources.length} relevant passages from "${sources[0].metadata.filename}"`;
+                    messageDiv.appendChild(sourcesDiv);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
             }
-            addMessage('bot', data.data.answer + sourcesText);
-        } else {
-            addMessage('bot', `❌ Error: ${data.message}`);
         }
     } catch (error) {
         addMessage('bot', `❌ Connection error: ${error.message}`);
@@ -148,5 +181,6 @@ function addMessage(type, content) {
     messageDiv.innerHTML = content;
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
 }
 
@@ -8,21 +8,43 @@ export interface Config {
   qdrant: {
     url: string;
     apiKey?: string;
+    upsertBatchSize: number;
   };
   collection: {
     name: string;
   };
   ollama: {
     url: string;
+    numParallel: number;
+    keepAlive: string | number;
+    heartbeatIntervalMs: number;
   };
   huggingface: {
     embeddingModel: string;
     llmModel: string;
   };
+  llm: {
+    contextTokenBudget: number;
+  };
+  embedding: {
+    batchSize: number;
+    batchWaitMs: number;
+    cacheSize: number;
+  };
   document: {
     chunkSize: number;
     chunkOverlap: number;
   };
+  semanticCache: {
+    enabled: boolean;
+    collectionName: string;
+    minThreshold: number;
+  };
+}
+
+// Ollama nhận keep_alive dạng số giây (âm = không bao giờ unload) hoặc duration string như "24h"
+function parseKeepAlive(value: string): string | number {
+  return /^-?\d+$/.test(value) ? parseInt(value, 10) : value;
 }
 
 export const config: Config = {
@@ -31,20 +53,37 @@ export const config: Config = {
   qdrant: {
     url: process.env.QDRANT_URL || 'http://localhost:6333',
     apiKey: process.env.QDRANT_API_KEY,
+    upsertBatchSize: parseInt(process.env.UPSERT_BATCH_SIZE || '100', 10),
   },
   collection: {
     name: process.env.COLLECTION_NAME || 'documents',
   },
   ollama: {
     url: process.env.OLLAMA_URL || 'http://localhost:11434',
+    numParallel: parseInt(process.env.OLLAMA_NUM_PARALLEL || '4', 10),
+    keepAlive: parseKeepAlive(process.env.OLLAMA_KEEP_ALIVE || '-1'),
+    heartbeatIntervalMs: parseInt(process.env.OLLAMA_HEARTBEAT_INTERVAL_MS || '300000', 10),
   },
   huggingface: {
     embeddingModel: process.env.EMBEDDING_MODEL || 'nomic-embed-text',
     llmModel: process.env.LLM_MODEL || 'mistral',
   },
+  llm: {
+    contextTokenBudget: parseInt(process.env.LLM_CONTEXT_TOKEN_BUDGET || '2048', 10),
+  },
+  embedding: {
+    batchSize: parseInt(process.env.EMBEDDING_BATCH_SIZE || '32', 10),
+    batchWaitMs: parseInt(process.env.EMBEDDING_BATCH_WAIT_MS || '10', 10),
+    cacheSize: parseInt(process.env.EMBEDDING_CACHE_SIZE || '10000', 10),
+  },
   document: {
     chunkSize: parseInt(process.env.CHUNK_SIZE || '1000', 10),
     chunkOverlap: parseInt(process.env.CHUNK_OVERLAP || '200', 10),
   },
+  semanticCache: {
+    enabled: process.env.SEMANTIC_CACHE_ENABLED !== 'false',
+    collectionName: process.env.SEMANTIC_CACHE_COLLECTION || 'llm_cache',
+    minThreshold: parseFloat(process.env.SEMANTIC_CACHE_MIN_THRESHOLD || '0.95'),
+  },
 };
 
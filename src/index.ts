@@ -5,7 +5,7 @@ import { config } from './config';
 import uploadRouter from './routes/upload';
 import chatRouter from './routes/chat';
 import healthRouter from './routes/health';
-import { VectorStore } from './services/vectorStore';
+import { vectorStore, ragChain } from './services/instances';
 
 const app = express();
 
@@ -27,10 +27,10 @@ app.get('/', (req, res) => {
   res.sendFile(path.join(__dirname, '../public/index.html'));
 });
 
-// Initialize vector store collection
+// Initialize vector store collection.
+// Dùng shared client nên connection tới Qdrant được mở sẵn trước request đầu tiên.
 async function initializeVectorStore() {
   try {
-    const vectorStore = new VectorStore();
     await vectorStore.createCollectionIfNotExists();
     console.log('Vector store has been initialized');
   } catch (error) {
@@ -38,12 +38,35 @@ async function initializeVectorStore() {
   }
 }
 
+// Load LLM model trước request đầu tiên, sau đó ping định kỳ để model luôn được giữ trong memory
+async function warmUpLLM() {
+  try {
+    const loadMs = await ragChain.warmUp();
+    console.log(`LLM model is warm (loaded in ${loadMs}ms)`);
+  } catch (error) {
+    console.error('Error warming up LLM model:', error);
+  }
+
+  if (config.ollama.heartbeatIntervalMs > 0) {
+    setInterval(() => {
+      ragChain.warmUp().catch((error) => {
+        console.warn('LLM heartbeat failed:', error instanceof Error ? error.message : error);
+      });
+    }, config.ollama.heartbeatIntervalMs).unref();
+  }
+}
+
 // Start server
 const PORT = config.port;
 
 app.listen(PORT, async () => {
   console.log(`Server is running at http://localhost:${PORT}`);
+  console.log(
+    `Ollama concurrency: OLLAMA_NUM_PARALLEL=${config.ollama.numParallel}, ` +
+      `OLLAMA_MAX_LOADED_MODELS=${process.env.OLLAMA_MAX_LOADED_MODELS || '(server default)'}`
+  );
   await initializeVectorStore();
+  await warmUpLLM();
 });
 
 export default app;
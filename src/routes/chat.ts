@@ -1,10 +1,9 @@
 import { Router, Request, Response } from 'express';
-import { RAGChain } from '../services/ragChain';
-import { VectorStore } from '../services/vectorStore';
+import { ragChain } from '../services/instances';
 
 const router = Router();
-const vectorStore = new VectorStore();
-const ragChain = new RAGChain(vectorStore);
+
+const MAX_BATCH_QUESTIONS = 20;
 
 router.post('/', async (req: Request, res: Response) => {
   try {
@@ -35,5 +34,91 @@ router.post('/', async (req: Request, res: Response) => {
   }
 });
 
+router.post('/stream', async (req: Request, res: Response) => {
+  const { question, topK } = req.body;
+
+  if (!question || typeof question !== 'string') {
+    return res.status(400).json({
+      success: false,
+      message: 'Question is required',
+    });
+  }
+
+  const k = topK && typeof topK === 'number' ? Math.min(topK, 10) : 5;
+
+  // Stream các events dạng NDJSON, mỗi dòng một event
+  res.status(200);
+  res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+  res.setHeader('Cache-Control', 'no-cache');
+  res.flushHeaders();
+
+  // Client ngắt kết nối: huỷ request tới Ollama thay vì để nó generate tiếp
+  const controller = new AbortController();
+  res.on('close', () => {
+    if (!res.writableFinished) {
+      controller.abort();
+    }
+  });
+
+  try {
+    for await (const event of ragChain.queryStream(question.trim(), k, controller.signal)) {
+      if (res.writableEnded || res.destroyed) break;
+      res.write(JSON.stringify(event) + '\n');
+    }
+  } catch (error) {
+    if (controller.signal.aborted) return;
+    res.write(JSON.stringify({
+      type: 'error',
+      message: 'Error processing question',
+      error: error instanceof Error ? error.message : 'Unknown error',
+    }) + '\n');
+  } finally {
+    res.end();
+  }
+});
+
+router.post('/batch', async (req: Request, res: Response) => {
+  try {
+    const { questions, topK, singlePrompt } = req.body;
+
+    if (
+      !Array.isArray(questions) ||
+      questions.length === 0 ||
+      !questions.every((q) => typeof q === 'string' && q.trim())
+    ) {
+      return res.status(400).json({
+        success: false,
+        message: 'Questions must be a non-empty array of strings',
+      });
+    }
+
+    if (questions.length > MAX_BATCH_QUESTIONS) {
+      return res.status(400).json({
+        success: false,
+        message: `At most ${MAX_BATCH_QUESTIONS} questions are allowed per batch`,
+      });
+    }
+
+    const k = topK && typeof topK === 'number' ? Math.min(topK, 10) : 5;
+
+    // Query RAG chain cho tất cả câu hỏi
+    const trimmed = questions.map((q: string) => q.trim());
+    const responses = singlePrompt === true
+      ? await ragChain.queryBatchPrompted(trimmed, k)
+      : await ragChain.queryBatch(trimmed, k);
+
+    res.status(200).json({
+      success: true,
+      data: responses,
+    });
+  } catch (error) {
+    res.status(500).json({
+      success: false,
+      message: 'Error processing questions',
+      error: error instanceof Error ? error.message : 'Unknown error',
+    });
+  }
+});
+
 export default router;
 
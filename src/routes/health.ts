@@ -1,8 +1,7 @@
 import { Router, Request, Response } from 'express';
-import { VectorStore } from '../services/vectorStore';
+import { vectorStore } from '../services/instances';
 
 const router = Router();
-const vectorStore = new VectorStore();
 
 router.get('/', async (req: Request, res: Response) => {
   try {
@@ -3,10 +3,9 @@ import multer from 'multer';
 import path from 'path';
 import { DocumentLoader } from '../services/documentLoader';
 import { TextSplitter } from '../services/textSplitter';
-import { VectorStore } from '../services/vectorStore';
+import { vectorStore, semanticCache } from '../services/instances';
 
 const router = Router();
-const vectorStore = new VectorStore();
 
 // Configure multer for file uploads
 const storage = multer.diskStorage({
@@ -44,20 +43,19 @@ router.post('/', upload.single('document'), async (req: Request, res: Response)
 
     const filepath = req.file.path;
 
-    // Load document
+    // Load document dạng stream
     console.log(`Loading document: ${req.file.originalname}`);
-    const document = await DocumentLoader.loadTextFile(filepath);
-    console.log(`Document loaded: ${document.content.length} characters`);
+    const document = DocumentLoader.streamTextFile(filepath);
 
-    // Split into chunks
-    console.log('Splitting document into chunks...');
-    const chunks = TextSplitter.splitDocument(document);
-    console.log(`Document split into ${chunks.length} chunks`);
+    // Split into chunks và add to vector store (create embeddings and store in Qdrant)
+    // theo từng batch, không load toàn bộ file vào RAM
+    console.log('Splitting document into chunks, creating embeddings and storing in vector database...');
+    const chunks = TextSplitter.splitStream(document.windows, document.metadata);
+    const chunkCount = await vectorStore.addDocuments(chunks);
+    console.log(`Successfully embedded and stored ${chunkCount} chunks (${document.size} characters) in Qdrant`);
 
-    // Add to vector store (create embeddings and store in Qdrant)
-    console.log('Creating embeddings and storing in vector database...');
-    await vectorStore.addDocuments(chunks);
-    console.log(`Successfully embedded and stored ${chunks.length} chunks in Qdrant`);
+    // Cached answers có thể đã lỗi thời khi có document mới
+    await semanticCache.clear();
 
     res.status(200).json({
       success: true,
@@ -65,8 +63,8 @@ router.post('/', upload.single('document'), async (req: Request, res: Response)
       data: {
         filename: document.metadata.filename,
         originalFilename: req.file.originalname,
-        chunks: chunks.length,
-        size: document.content.length,
+        chunks: chunkCount,
+        size: document.size,
         status: 'Embedded and stored in vector database',
       },
     });
@@ -1,32 +1,74 @@
-import fs from 'fs/promises';
+import { createReadStream } from 'fs';
 import path from 'path';
 
-export interface Document {
-  content: string;
-  metadata: {
-    filename: string;
-    filepath: string;
-    uploadedAt: Date;
-  };
+// Kích thước mỗi window khi đọc file dạng stream (1MB)
+const STREAM_WINDOW_SIZE = 1024 * 1024;
+
+export interface DocumentMetadata {
+  filename: string;
+  filepath: string;
+  uploadedAt: Date;
+}
+
+export interface DocumentStream {
+  metadata: DocumentMetadata;
+  windows: AsyncIterable<string>;
+  // Số ký tự của nội dung đã trim, chỉ đầy đủ sau khi đọc hết windows
+  size: number;
 }
 
 export class DocumentLoader {
   /**
-   * Load và parse file .txt
+   * Mở file .txt dạng stream, đọc từng window thay vì load toàn bộ vào RAM
    */
-  static async loadTextFile(filepath: string): Promise<Document> {
+  static streamTextFile(filepath: string, windowSize: number = STREAM_WINDOW_SIZE): DocumentStream {
+    // Đếm size như content.trim().length: bỏ khoảng trắng đầu file,
+    // khoảng trắng cuối chỉ bị trừ nếu không còn content phía sau
+    let atStart = true;
+    let readLength = 0;
+    let trailingWhitespace = 0;
+
+    const documentStream: DocumentStream = {
+      metadata: {
+        filename: path.basename(filepath),
+        filepath,
+        uploadedAt: new Date(),
+      },
+      windows: DocumentLoader.readWindows(filepath, windowSize, (window) => {
+        const text = atStart ? window.trimStart() : window;
+        if (text.length === 0) {
+          return;
+        }
+        atStart = false;
+
+        const contentLength = text.trimEnd().length;
+        readLength += text.length;
+        trailingWhitespace = contentLength === 0
+          ? trailingWhitespace + text.length
+          : text.length - contentLength;
+        documentStream.size = readLength - trailingWhitespace;
+      }),
+      size: 0,
+    };
+
+    return documentStream;
+  }
+
+  private static async *readWindows(
+    filepath: string,
+    windowSize: number,
+    onWindow: (window: string) => void
+  ): AsyncGenerator<string> {
     try {
-      const content = await fs.readFile(filepath, 'utf-8');
-      const filename = path.basename(filepath);
-
-      return {
-        content: content.trim(),
-        metadata: {
-          filename,
-          filepath,
-          uploadedAt: new Date(),
-        },
-      };
+      const stream = createReadStream(filepath, {
+        encoding: 'utf-8',
+        highWaterMark: windowSize,
+      });
+
+      for await (const window of stream) {
+        onWindow(window as string);
+        yield window as string;
+      }
     } catch (error) {
       throw new Error(`Cannot read file: ${filepath}. Error: ${error}`);
     }
@@ -1,14 +1,31 @@
 import { config } from '../config';
+import { mapWithConcurrency } from '../utils/concurrency';
+import { EmbeddingCache } from './embeddingCache';
+import { normalize } from '../utils/vector';
+
+interface PendingEmbedding {
+  text: string;
+  resolve: (embedding: number[]) => void;
+  reject: (error: Error) => void;
+}
 
 export class Embedder {
   private ollamaUrl: string;
   private model: string;
+  private batchSize: number;
+  private batchWaitMs: number;
   private modelPulling: Promise<void> | null = null;
   private modelReady: boolean = false;
+  private pending: PendingEmbedding[] = [];
+  private flushTimer: NodeJS.Timeout | null = null;
+  private cache: EmbeddingCache;
 
   constructor() {
     this.ollamaUrl = process.env.OLLAMA_URL || 'http://localhost:11434';
     this.model = config.huggingface.embeddingModel || 'nomic-embed-text';
+    this.batchSize = config.embedding.batchSize;
+    this.batchWaitMs = config.embedding.batchWaitMs;
+    this.cache = new EmbeddingCache(this.model, config.embedding.cacheSize);
     console.log(`Using Ollama for embeddings at ${this.ollamaUrl} with model: ${this.model}`);
   }
 
@@ -65,110 +82,153 @@ export class Embedder {
   }
 
   /**
-   * Tạo embedding cho một đoạn text sử dụng Ollama
+   * Đảm bảo model đã được pull, các request đồng thời dùng chung một lần pull
    */
-  async embedText(text: string): Promise<number[]> {
-    try {
-      // Ensure model is ready before making request
-      if (!this.modelReady) {
-        await this.pullModel();
-      }
+  private async ensureModel(): Promise<void> {
+    if (this.modelReady) {
+      return;
+    }
 
-      const response = await fetch(`${this.ollamaUrl}/api/embeddings`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          model: this.model,
-          prompt: text,
-        }),
-      });
+    if (!this.modelPulling) {
+      this.modelPulling = this.pullModel()
+        .then(() => {
+          this.modelReady = true;
+        })
+        .finally(() => {
+          this.modelPulling = null;
+        });
+    }
+    await this.modelPulling;
+  }
 
-      if (!response.ok) {
-        const errorText = await response.text();
-        
-        // If model not found or EOF error (model loading), try to pull/ensure it exists
-        if (response.status === 404 && errorText.includes('not found')) {
-          console.log(`Model ${this.model} not found, attempting to pull...`);
-          await this.pullModel();
-          
-          // Wait a bit for model to be ready
-          await new Promise(resolve => setTimeout(resolve, 2000));
-          
-          // Retry the request after pulling
-          const retryResponse = await fetch(`${this.ollamaUrl}/api/embeddings`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              model: this.model,
-              prompt: text,
-            }),
-          });
-
-          if (!retryResponse.ok) {
-            const retryErrorText = await retryResponse.text();
-            throw new Error(`Ollama API error: ${retryResponse.status} ${retryResponse.statusText} - ${retryErrorText}`);
-          }
+  /**
+   * Gọi Ollama /api/embed cho một batch texts
+   */
+  private async postEmbed(texts: string[]): Promise<Response> {
+    return fetch(`${this.ollamaUrl}/api/embed`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        model: this.model,
+        input: texts,
+        keep_alive: config.ollama.keepAlive,
+      }),
+    });
+  }
 
-          const retryData = await retryResponse.json();
-          if (!retryData.embedding || !Array.isArray(retryData.embedding)) {
-            throw new Error('Invalid response format from Ollama');
-          }
-          return retryData.embedding as number[];
-        }
-        
-        // If EOF error, model might be loading - wait and retry
-        if (response.status === 500 && errorText.includes('EOF')) {
-          console.log(`Model ${this.model} appears to be loading, waiting and retrying...`);
-          await new Promise(resolve => setTimeout(resolve, 3000));
-          
-          const retryResponse = await fetch(`${this.ollamaUrl}/api/embeddings`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              model: this.model,
-              prompt: text,
-            }),
-          });
-
-          if (!retryResponse.ok) {
-            const retryErrorText = await retryResponse.text();
-            throw new Error(`Ollama API error: ${retryResponse.status} ${retryResponse.statusText} - ${retryErrorText}`);
-          }
+  /**
+   * Tạo embeddings cho một batch texts trong một request tới Ollama
+   */
+  private async requestEmbeddings(texts: string[]): Promise<number[][]> {
+    // Ensure model is ready before making request
+    await this.ensureModel();
 
-          const retryData = await retryResponse.json();
-          if (!retryData.embedding || !Array.isArray(retryData.embedding)) {
-            throw new Error('Invalid response format from Ollama');
-          }
-          return retryData.embedding as number[];
-        }
-        
+    let response = await this.postEmbed(texts);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+
+      if (response.status === 404 && errorText.includes('not found')) {
+        // If model not found, try to pull it and retry
+        console.log(`Model ${this.model} not found, attempting to pull...`);
+        this.modelReady = false;
+        await this.ensureModel();
+
+        // Wait a bit for model to be ready
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        response = await this.postEmbed(texts);
+      } else if (response.status === 500 && errorText.includes('EOF')) {
+        // If EOF error, model might be loading - wait and retry
+        console.log(`Model ${this.model} appears to be loading, waiting and retrying...`);
+        await new Promise(resolve => setTimeout(resolve, 3000));
+        response = await this.postEmbed(texts);
+      } else {
         throw new Error(`Ollama API error: ${response.status} ${response.statusText} - ${errorText}`);
       }
 
-      const data = await response.json();
-      
-      if (!data.embedding || !Array.isArray(data.embedding)) {
-        throw new Error('Invalid response format from Ollama');
+      if (!response.ok) {
+        const retryErrorText = await response.text();
+        throw new Error(`Ollama API error: ${response.status} ${response.statusText} - ${retryErrorText}`);
       }
+    }
 
-      return data.embedding as number[];
-    } catch (error: any) {
-      const errorMessage = error?.message || String(error);
-      console.error('Single embedding error:', {
-        message: errorMessage,
-        model: this.model,
-        ollamaUrl: this.ollamaUrl
+    const data = await response.json();
+
+    if (!Array.isArray(data.embeddings) || data.embeddings.length !== texts.length) {
+      throw new Error('Invalid response format from Ollama');
+    }
+
+    // Chuẩn hoá L2 để collections có thể dùng Dot thay cho Cosine
+    return (data.embeddings as number[][]).map(normalize);
+  }
+
+  /**
+   * Gửi các embedText requests đang chờ thành một batch
+   */
+  private flushPending(): void {
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+
+    const batch = this.pending.splice(0, this.batchSize);
+    if (batch.length === 0) {
+      return;
+    }
+
+    this.requestEmbeddings(batch.map((item) => item.text))
+      .then((embeddings) => {
+        batch.forEach((item, index) => {
+          this.cache.set(item.text, embeddings[index]);
+          item.resolve(embeddings[index]);
+        });
+      })
+      .catch((error: any) => {
+        const errorMessage = error?.message || String(error);
+        console.error('Single embedding error:', {
+          message: errorMessage,
+          model: this.model,
+          ollamaUrl: this.ollamaUrl,
+          batchSize: batch.length
+        });
+        const wrapped = new Error(`Error creating embedding: ${errorMessage}`);
+        batch.forEach((item) => item.reject(wrapped));
       });
-      throw new Error(`Error creating embedding: ${errorMessage}`);
+
+    if (this.pending.length > 0) {
+      this.scheduleFlush();
     }
   }
 
+  /**
+   * Hẹn flush sau batchWaitMs, hoặc flush ngay khi batch đã đầy
+   */
+  private scheduleFlush(): void {
+    if (this.pending.length >= this.batchSize) {
+      this.flushPending();
+    } else if (!this.flushTimer) {
+      this.flushTimer = setTimeout(() => this.flushPending(), this.batchWaitMs);
+    }
+  }
+
+  /**
+   * Tạo embedding cho một đoạn text sử dụng Ollama.
+   * Các lời gọi đồng thời trong cùng cửa sổ batchWaitMs được gộp thành một request.
+   */
+  async embedText(text: string): Promise<number[]> {
+    const cached = this.cache.get(text);
+    if (cached) {
+      return cached;
+    }
+
+    return new Promise<number[]>((resolve, reject) => {
+      this.pending.push({ text, resolve, reject });
+      this.scheduleFlush();
+    });
+  }
+
   /**
    * Tạo embeddings cho nhiều texts sử dụng Ollama
    */
@@ -176,12 +236,37 @@ export class Embedder {
     try {
       console.log(`Creating embeddings for ${texts.length} texts using Ollama model: ${this.model}`);
       
-      // Ollama doesn't support batch embeddings, so we need to call individually
-      // But we can do it in parallel for better performance
-      const embeddingPromises = texts.map(text => this.embedText(text));
-      const embeddings = await Promise.all(embeddingPromises);
+      // Lấy embeddings đã cache, chỉ gửi những texts bị miss tới Ollama
+      const embeddings: number[][] = new Array(texts.length);
+      const missIndexes: number[] = [];
+      texts.forEach((text, index) => {
+        const cached = this.cache.get(text);
+        if (cached) {
+          embeddings[index] = cached;
+        } else {
+          missIndexes.push(index);
+        }
+      });
+
+      // Gửi theo batches qua /api/embed, song song giới hạn theo parallel slots của server
+      const batches: string[][] = [];
+      for (let i = 0; i < missIndexes.length; i += this.batchSize) {
+        batches.push(missIndexes.slice(i, i + this.batchSize).map((index) => texts[index]));
+      }
+
+      const batchEmbeddings = await mapWithConcurrency(
+        batches,
+        config.ollama.numParallel,
+        (batch) => this.requestEmbeddings(batch)
+      );
+
+      batchEmbeddings.flat().forEach((embedding, missIndex) => {
+        const index = missIndexes[missIndex];
+        embeddings[index] = embedding;
+        this.cache.set(texts[index], embedding);
+      });
 
-      console.log(`Successfully created ${embeddings.length} embeddings`);
+      console.log(`Successfully created ${embeddings.length} embeddings (${texts.length - missIndexes.length} from cache)`);
       return embeddings;
     } catch (error: any) {
       const errorMessage = error?.message || String(error);
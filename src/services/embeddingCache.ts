@@ -0,0 +1,60 @@
+import { createHash } from 'crypto';
+
+/**
+ * LRU cache cho embeddings, key theo sha256(model + text).
+ * Vectors lưu dạng Float32Array, bằng một nửa bộ nhớ so với number[] (float64).
+ */
+export class EmbeddingCache {
+  private model: string;
+  private maxEntries: number;
+  private entries: Map<string, Float32Array> = new Map();
+
+  constructor(model: string, maxEntries: number) {
+    this.model = model;
+    this.maxEntries = maxEntries;
+  }
+
+  /**
+   * Lấy embedding đã cache, trả về undefined khi miss
+   */
+  get(text: string): number[] | undefined {
+    if (this.maxEntries <= 0) {
+      return undefined;
+    }
+
+    const key = this.key(text);
+    const vector = this.entries.get(key);
+    if (!vector) {
+      return undefined;
+    }
+
+    // Đưa entry lên cuối Map (most recently used)
+    this.entries.delete(key);
+    this.entries.set(key, vector);
+    return Array.from(vector);
+  }
+
+  /**
+   * Lưu embedding, xoá entry ít dùng nhất khi cache đầy
+   */
+  set(text: string, embedding: number[]): void {
+    if (this.maxEntries <= 0) {
+      return;
+    }
+
+    const key = this.key(text);
+    this.entries.delete(key);
+    this.entries.set(key, Float32Array.from(embedding));
+
+    if (this.entries.size > this.maxEntries) {
+      const oldestKey = this.entries.keys().next().value;
+      if (oldestKey !== undefined) {
+        this.entries.delete(oldestKey);
+      }
+    }
+  }
+
+  private key(text: string): string {
+    return createHash('sha256').update(this.model).update('\0').update(text).digest('base64');
+  }
+}
@@ -0,0 +1,16 @@
+import { QdrantClient } from '@qdrant/js-client-rest';
+import { config } from '../config';
+import { VectorStore } from './vectorStore';
+import { SemanticCache } from './semanticCache';
+import { RAGChain } from './ragChain';
+
+// Các services dùng chung cho toàn app: một Qdrant client (giữ connection keep-alive),
+// một Embedder (micro-batching queue + embedding cache) thay vì mỗi route một bản
+export const qdrantClient = new QdrantClient({
+  url: config.qdrant.url,
+  apiKey: config.qdrant.apiKey,
+});
+
+export const vectorStore = new VectorStore(qdrantClient);
+export const semanticCache = new SemanticCache(qdrantClient);
+export const ragChain = new RAGChain(vectorStore, semanticCache);
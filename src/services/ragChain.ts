@@ -1,19 +1,54 @@
 import { config } from '../config';
 import { VectorStore, SearchResult } from './vectorStore';
+import { SemanticCache } from './semanticCache';
+import { mapWithConcurrency } from '../utils/concurrency';
+import { meanVector, minPairwiseCosine, normalize } from '../utils/vector';
+
+// Ngưỡng cosine similarity tối thiểu giữa các câu hỏi để dùng chung context
+const SHARED_CONTEXT_MIN_SIMILARITY = 0.75;
+
+// Ước lượng thô số ký tự trên mỗi token
+const CHARS_PER_TOKEN = 4;
+
+// Phần cố định của prompts, dựng một lần thay vì mỗi request
+const PROMPT_ROLE = 'You are an intelligent AI assistant.';
+const PROMPT_CONTEXT_HEADER = '\n\nContext from document:\n';
+const PROMPT_NO_CONTEXT_NOTE = 'If the information is not in the context, please clearly state that.';
+const SINGLE_PROMPT_PREFIX =
+  `${PROMPT_ROLE} Please answer the question based on the context provided from the document.${PROMPT_CONTEXT_HEADER}`;
+const SINGLE_PROMPT_SUFFIX =
+  `\n\nPlease answer the question accurately and in detail based on the context above. ${PROMPT_NO_CONTEXT_NOTE}\n\nAnswer:`;
+const BATCH_PROMPT_PREFIX =
+  `${PROMPT_ROLE} Please answer each question based on the context provided from the document.${PROMPT_CONTEXT_HEADER}`;
+const BATCH_PROMPT_INSTRUCTIONS =
+  `\n\nPlease answer every question accurately and in detail based on the context above. ${PROMPT_NO_CONTEXT_NOTE}\nAnswer the questions in order, using exactly this format:\n`;
+
+// Sampling options cố định cho mọi lần gọi /api/generate
+const GENERATE_OPTIONS = {
+  temperature: 0.7,
+  top_p: 0.9,
+};
 
 export interface ChatResponse {
   answer: string;
   sources: SearchResult[];
 }
 
+export type ChatStreamEvent =
+  | { type: 'sources'; sources: SearchResult[] }
+  | { type: 'token'; token: string }
+  | { type: 'done' };
+
 export class RAGChain {
   private ollamaUrl: string;
   private vectorStore: VectorStore;
+  private semanticCache: SemanticCache;
   private llmModel: string;
 
-  constructor(vectorStore: VectorStore) {
+  constructor(vectorStore: VectorStore, semanticCache: SemanticCache) {
     this.ollamaUrl = config.ollama.url;
     this.vectorStore = vectorStore;
+    this.semanticCache = semanticCache;
     this.llmModel = config.huggingface.llmModel;
     console.log(`Using Ollama for LLM at ${this.ollamaUrl} with model: ${this.llmModel}`);
   }
@@ -22,20 +57,95 @@ export class RAGChain {
    * Tạo prompt với context từ retrieved documents
    */
   private createPrompt(query: string, contexts: SearchResult[]): string {
-    const contextText = contexts
-      .map((ctx, idx) => `[${idx + 1}] ${ctx.text}`)
-      .join('\n\n');
+    return SINGLE_PROMPT_PREFIX + this.formatContext(contexts) +
+      '\n\nQuestion: ' + query + SINGLE_PROMPT_SUFFIX;
+  }
+
+  /**
+   * Tạo một prompt chứa nhiều câu hỏi dùng chung context,
+   * yêu cầu LLM trả lời theo format A1:, A2:, ...
+   */
+  private createBatchPrompt(questions: string[], contexts: SearchResult[]): string {
+    const questionText = questions.map((q, idx) => `Q${idx + 1}: ${q}`).join('\n');
+    const answerFormat = questions.map((_, idx) => `A${idx + 1}: <answer to Q${idx + 1}>`).join('\n');
+
+    return BATCH_PROMPT_PREFIX + this.formatContext(contexts) +
+      '\n\nQuestions:\n' + questionText +
+      BATCH_PROMPT_INSTRUCTIONS + answerFormat + '\n\nAnswers:';
+  }
+
+  /**
+   * Giữ các contexts theo thứ tự relevance cho tới khi hết token budget,
+   * để prompt không phình ra theo topK và kích thước chunk
+   */
+  private fitToBudget(contexts: SearchResult[]): SearchResult[] {
+    const budgetChars = config.llm.contextTokenBudget * CHARS_PER_TOKEN;
+    const fitted: SearchResult[] = [];
+    let usedChars = 0;
+
+    for (const ctx of contexts) {
+      const remaining = budgetChars - usedChars;
+      if (remaining <= 0) {
+        break;
+      }
+
+      if (ctx.text.length <= remaining) {
+        fitted.push(ctx);
+        usedChars += ctx.text.length;
+      } else {
+        // Context đầu tiên luôn được giữ (cắt bớt) để prompt không bị rỗng
+        if (fitted.length === 0) {
+          fitted.push({ ...ctx, text: ctx.text.slice(0, remaining) });
+          usedChars += remaining;
+        }
+        break;
+      }
+    }
 
-    return `You are an intelligent AI assistant. Please answer the question based on the context provided from the document.
+    if (fitted.length < contexts.length || usedChars >= budgetChars) {
+      console.log(`Context trimmed to ${fitted.length}/${contexts.length} passages (~${Math.ceil(usedChars / CHARS_PER_TOKEN)} tokens, budget ${config.llm.contextTokenBudget})`);
+    }
+
+    return fitted;
+  }
 
-Context from document:
-${contextText}
+  /**
+   * Format retrieved documents thành context block
+   */
+  private formatContext(contexts: SearchResult[]): string {
+    // Nối trực tiếp vào một string, không tạo mảng trung gian như map().join()
+    let text = '';
+    for (let i = 0; i < contexts.length; i++) {
+      if (i > 0) {
+        text += '\n\n';
+      }
+      text += '[' + (i + 1) + '] ' + contexts[i].text;
+    }
+    return text;
+  }
 
-Question: ${query}
+  /**
+   * Parse response dạng "A1: ... A2: ..." theo index câu hỏi.
+   * Trả về null nếu thiếu câu trả lời nào.
+   */
+  private parseBatchAnswers(text: string, count: number): string[] | null {
+    const answers: string[] = new Array(count);
+    const pattern = /A(\d+):\s*([\s\S]*?)(?=\n\s*A\d+:|$)/g;
 
-Please answer the question accurately and in detail based on the context above. If the information is not in the context, please clearly state that.
+    let match: RegExpExecArray | null;
+    while ((match = pattern.exec(text)) !== null) {
+      const index = parseInt(match[1], 10) - 1;
+      if (index >= 0 && index < count && answers[index] === undefined) {
+        answers[index] = match[2].trim();
+      }
+    }
 
-Answer:`;
+    for (let i = 0; i < count; i++) {
+      if (!answers[i]) {
+        return null;
+      }
+    }
+    return answers;
   }
 
   /**
@@ -91,73 +201,76 @@ Answer:`;
   }
 
   /**
-   * Generate answer sử dụng Ollama LLM
+   * Gọi Ollama /api/generate, tự pull model và retry nếu model chưa có.
+   * signal huỷ request (và giải phóng parallel slot của Ollama) khi client ngắt kết nối.
    */
-  async generateAnswer(
-    query: string,
-    contexts: SearchResult[]
-  ): Promise<string> {
-    try {
-      const prompt = this.createPrompt(query, contexts);
-
-      const response = await fetch(`${this.ollamaUrl}/api/generate`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
+  private async postGenerate(
+    prompt: string,
+    numPredict: number,
+    stream: boolean,
+    signal?: AbortSignal
+  ): Promise<Response> {
+    const send = () => fetch(`${this.ollamaUrl}/api/generate`, {
+      method: 'POST',
+      signal,
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        model: this.llmModel,
+        prompt: prompt,
+        stream: stream,
+        keep_alive: config.ollama.keepAlive,
+        options: {
+          ...GENERATE_OPTIONS,
+          num_predict: numPredict,
         },
-        body: JSON.stringify({
-          model: this.llmModel,
-          prompt: prompt,
-          stream: false,
-          options: {
-            temperature: 0.7,
-            top_p: 0.9,
-            num_predict: 512,
-          },
-        }),
-      });
+      }),
+    });
+
+    const response = await send();
 
-      if (!response.ok) {
-        const errorText = await response.text();
+    if (!response.ok) {
+      const errorText = await response.text();
+      
+      // If model not found, try to pull it
+      if (response.status === 404 && errorText.includes('not found')) {
+        console.log(`LLM model ${this.llmModel} not found, attempting to pull...`);
+        await this.pullModel();
         
-        // If model not found, try to pull it
-        if (response.status === 404 && errorText.includes('not found')) {
-          console.log(`LLM model ${this.llmModel} not found, attempting to pull...`);
-          await this.pullModel();
-          
-          // Retry the request after pulling
-          const retryResponse = await fetch(`${this.ollamaUrl}/api/generate`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-              model: this.llmModel,
-              prompt: prompt,
-              stream: false,
-              options: {
-                temperature: 0.7,
-                top_p: 0.9,
-                num_predict: 512,
-              },
-            }),
-          });
-
-          if (!retryResponse.ok) {
-            const retryErrorText = await retryResponse.text();
-            throw new Error(`Ollama API error: ${retryResponse.status} ${retryResponse.statusText} - ${retryErrorText}`);
-          }
+        // Retry the request after pulling
+        const retryResponse = await send();
 
-          const retryData = await retryResponse.json();
-          if (!retryData.response) {
-            throw new Error('Invalid response format from Ollama');
-          }
-          return retryData.response.trim();
+        if (!retryResponse.ok) {
+          const retryErrorText = await retryResponse.text();
+          throw new Error(`Ollama API error: ${retryResponse.status} ${retryResponse.statusText} - ${retryErrorText}`);
         }
-        
-        throw new Error(`Ollama API error: ${response.status} ${response.statusText} - ${errorText}`);
+        return retryResponse;
       }
+      
+      throw new Error(`Ollama API error: ${response.status} ${response.statusText} - ${errorText}`);
+    }
+
+    return response;
+  }
+
+  /**
+   * Load LLM model vào memory của Ollama (prompt rỗng chỉ load model, không generate).
+   * Trả về thời gian load tính bằng ms.
+   */
+  async warmUp(): Promise<number> {
+    const startedAt = Date.now();
+    const response = await this.postGenerate('', 1, false);
+    await response.json();
+    return Date.now() - startedAt;
+  }
 
+  /**
+   * Gửi prompt tới Ollama LLM và trả về text đã generate
+   */
+  private async generate(prompt: string, numPredict: number = 512): Promise<string> {
+    try {
+      const response = await this.postGenerate(prompt, numPredict, false);
       const data = await response.json();
       
       if (!data.response) {
@@ -177,12 +290,88 @@ Answer:`;
   }
 
   /**
-   * RAG pipeline: Retrieve + Generate
+   * Gửi prompt tới Ollama LLM ở chế độ streaming, yield từng token ngay khi có
    */
-  async query(query: string, topK: number = 5): Promise<ChatResponse> {
+  private async *generateStream(
+    prompt: string,
+    numPredict: number = 512,
+    signal?: AbortSignal
+  ): AsyncGenerator<string> {
+    let reader: ReadableStreamDefaultReader<Uint8Array> | undefined;
     try {
-      // 1. Retrieve relevant documents
-      const sources = await this.vectorStore.searchSimilar(query, topK);
+      const response = await this.postGenerate(prompt, numPredict, true, signal);
+      reader = response.body?.getReader();
+      if (!reader) {
+        throw new Error('Invalid response format from Ollama');
+      }
+
+      // Response là NDJSON, một dòng có thể bị chia qua nhiều chunks
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() || '';
+
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const data = JSON.parse(line);
+          if (data.error) {
+            throw new Error(data.error);
+          }
+          if (data.response) {
+            yield data.response as string;
+          }
+        }
+      }
+    } catch (error: any) {
+      const errorMessage = error?.message || String(error);
+      if (!signal?.aborted) {
+        console.error('LLM generation error:', {
+          message: errorMessage,
+          model: this.llmModel,
+          ollamaUrl: this.ollamaUrl
+        });
+      }
+      throw new Error(`Error generating answer: ${errorMessage}`);
+    } finally {
+      // Consumer dừng sớm hoặc có lỗi: đóng response để Ollama ngừng generate
+      reader?.cancel().catch(() => {});
+    }
+  }
+
+  /**
+   * Generate answer sử dụng Ollama LLM
+   */
+  async generateAnswer(
+    query: string,
+    contexts: SearchResult[]
+  ): Promise<string> {
+    return this.generate(this.createPrompt(query, contexts));
+  }
+
+  /**
+   * RAG pipeline: Retrieve + Generate.
+   * Truyền queryVector nếu caller đã có embedding của câu hỏi.
+   */
+  async query(query: string, topK: number = 5, queryVector?: number[]): Promise<ChatResponse> {
+    try {
+      // 1. Tạo query embedding một lần, dùng cho cả cache lookup và retrieval
+      const queryEmbedding = queryVector ?? await this.vectorStore.embedQuery(query);
+
+      const cached = await this.semanticCache.lookup(queryEmbedding, topK);
+      if (cached) {
+        return cached;
+      }
+
+      // 2. Retrieve relevant documents, giới hạn theo token budget của prompt
+      const sources = this.fitToBudget(
+        await this.vectorStore.searchSimilar(query, topK, queryEmbedding)
+      );
 
       if (sources.length === 0) {
         return {
@@ -191,16 +380,129 @@ Answer:`;
         };
       }
 
-      // 2. Generate answer với context
+      // 3. Generate answer với context
       const answer = await this.generateAnswer(query, sources);
+      const response = { answer, sources };
 
-      return {
-        answer,
-        sources,
-      };
+      await this.semanticCache.store(queryEmbedding, query, topK, response);
+
+      return response;
     } catch (error) {
       throw new Error(`Error in RAG pipeline: ${error}`);
     }
   }
+
+  /**
+   * RAG pipeline dạng streaming: trả sources trước, sau đó từng token của câu trả lời.
+   * Abort signal để dừng generate khi client ngắt kết nối.
+   */
+  async *queryStream(
+    query: string,
+    topK: number = 5,
+    signal?: AbortSignal
+  ): AsyncGenerator<ChatStreamEvent> {
+    const queryEmbedding = await this.vectorStore.embedQuery(query);
+
+    const cached = await this.semanticCache.lookup(queryEmbedding, topK);
+    if (cached) {
+      yield { type: 'sources', sources: cached.sources };
+      yield { type: 'token', token: cached.answer };
+      yield { type: 'done' };
+      return;
+    }
+
+    const sources = this.fitToBudget(
+      await this.vectorStore.searchSimilar(query, topK, queryEmbedding)
+    );
+    yield { type: 'sources', sources };
+
+    if (sources.length === 0) {
+      yield { type: 'token', token: 'Sorry, I could not find relevant information in the document.' };
+      yield { type: 'done' };
+      return;
+    }
+
+    let answer = '';
+    for await (const token of this.generateStream(this.createPrompt(query, sources), 512, signal)) {
+      // Bỏ khoảng trắng đầu câu trả lời, giống generate()
+      const text = answer ? token : token.trimStart();
+      if (!text) continue;
+      answer += text;
+      yield { type: 'token', token: text };
+    }
+
+    // Giống generate(): Ollama không trả về text nào thì báo lỗi, không cache câu trả lời rỗng
+    if (!answer.trim()) {
+      throw new Error('Error generating answer: Invalid response format from Ollama');
+    }
+
+    await this.semanticCache.store(queryEmbedding, query, topK, {
+      answer: answer.trim(),
+      sources,
+    });
+    yield { type: 'done' };
+  }
+
+  /**
+   * Chạy RAG pipeline cho nhiều câu hỏi song song,
+   * giới hạn theo số parallel slots của Ollama (OLLAMA_NUM_PARALLEL)
+   */
+  async queryBatch(
+    questions: string[],
+    topK: number = 5,
+    queryVectors?: number[][]
+  ): Promise<ChatResponse[]> {
+    // Embed tất cả câu hỏi trong một request nếu caller chưa có vectors
+    const vectors = queryVectors ?? await this.vectorStore.embedQueries(questions);
+
+    return mapWithConcurrency(questions, config.ollama.numParallel, (question, index) =>
+      this.query(question, topK, vectors[index])
+    );
+  }
+
+  /**
+   * Trả lời nhiều câu hỏi trong một lần gọi LLM.
+   * Chỉ gộp khi các câu hỏi cùng chủ đề (query embeddings gần nhau) để dùng chung context;
+   * nếu không, hoặc khi không parse được response, fallback về queryBatch.
+   */
+  async queryBatchPrompted(questions: string[], topK: number = 5): Promise<ChatResponse[]> {
+    if (questions.length < 2) {
+      return this.queryBatch(questions, topK);
+    }
+
+    try {
+      // 1. Kiểm tra các câu hỏi có cùng chủ đề không
+      const queryEmbeddings = await this.vectorStore.embedQueries(questions);
+      if (minPairwiseCosine(queryEmbeddings) < SHARED_CONTEXT_MIN_SIMILARITY) {
+        return this.queryBatch(questions, topK, queryEmbeddings);
+      }
+
+      // 2. Retrieve context chung bằng centroid của các query embeddings
+      const sources = this.fitToBudget(
+        await this.vectorStore.searchByVector(normalize(meanVector(queryEmbeddings)), topK)
+      );
+
+      if (sources.length === 0) {
+        return questions.map(() => ({
+          answer: 'Sorry, I could not find relevant information in the document.',
+          sources: [],
+        }));
+      }
+
+      // 3. Generate tất cả câu trả lời trong một prompt
+      const prompt = this.createBatchPrompt(questions, sources);
+      const response = await this.generate(prompt, 512 * questions.length);
+      const answers = this.parseBatchAnswers(response, questions.length);
+
+      if (!answers) {
+        console.warn('Could not parse batched answers, falling back to individual prompts');
+        return this.queryBatch(questions, topK, queryEmbeddings);
+      }
+
+      return answers.map((answer) => ({ answer, sources }));
+    } catch (error) {
+      throw new Error(`Error in batched RAG pipeline: ${error}`);
+    }
+  }
 }
 
@@ -0,0 +1,201 @@
+import { QdrantClient } from '@qdrant/js-client-rest';
+import { config } from '../config';
+import { SearchResult } from './vectorStore';
+import { toPointId } from '../utils/pointId';
+
+export interface CachedResponse {
+  answer: string;
+  sources: SearchResult[];
+}
+
+// Adaptive threshold: bắt đầu chặt, nới dần khi hit rate thấp hơn mục tiêu
+const INITIAL_THRESHOLD = 0.99;
+const TARGET_HIT_RATE = 0.8;
+const THRESHOLD_STEP = 0.005;
+const ADAPT_WINDOW = 50;
+
+export class SemanticCache {
+  private client: QdrantClient;
+  private collectionName: string;
+  private enabled: boolean;
+  private minThreshold: number;
+  private threshold: number = INITIAL_THRESHOLD;
+  private collectionReady: Promise<void> | null = null;
+  private windowLookups: number = 0;
+  private windowHits: number = 0;
+
+  constructor(client: QdrantClient) {
+    this.client = client;
+    this.collectionName = config.semanticCache.collectionName;
+    this.enabled = config.semanticCache.enabled;
+    this.minThreshold = Math.min(config.semanticCache.minThreshold, INITIAL_THRESHOLD);
+  }
+
+  /**
+   * Tạo cache collection nếu chưa tồn tại
+   */
+  private ensureCollection(vectorSize: number): Promise<void> {
+    if (!this.collectionReady) {
+      this.collectionReady = (async () => {
+        const collections = await this.client.getCollections();
+        const exists = collections.collections.some(
+          (col) => col.name === this.collectionName
+        );
+
+        if (!exists) {
+          await this.client.createCollection(this.collectionName, {
+            vectors: {
+              size: vectorSize,
+              distance: 'Dot',
+            },
+          });
+          console.log(`Cache collection "${this.collectionName}" has been created with dimension ${vectorSize}`);
+        }
+      })().catch((error) => {
+        this.collectionReady = null;
+        throw error;
+      });
+    }
+    return this.collectionReady;
+  }
+
+  /**
+   * Tìm response đã cache cho một query embedding.
+   * Trả về null khi cache miss hoặc cache gặp lỗi.
+   */
+  async lookup(queryVector: number[], topK: number): Promise<CachedResponse | null> {
+    if (!this.enabled) {
+      return null;
+    }
+
+    try {
+      await this.ensureCollection(queryVector.length);
+
+      const results = await this.client.search(this.collectionName, {
+        vector: queryVector,
+        limit: 1,
+        with_payload: true,
+        score_threshold: this.threshold,
+        filter: {
+          must: [{ key: 'topK', match: { value: topK } }],
+        },
+      });
+
+      const hit = results[0];
+      this.recordLookup(Boolean(hit));
+
+      if (!hit) {
+        return null;
+      }
+
+      console.log(`Semantic cache hit (score ${hit.score.toFixed(4)}, threshold ${this.threshold.toFixed(3)})`);
+      const sources = (hit.payload?.sources as SearchResult[]) || [];
+      return {
+        answer: hit.payload?.answer as string,
+        sources: sources.map((source) => ({
+          ...source,
+          metadata: {
+            ...source.metadata,
+            uploadedAt: new Date(source.metadata.uploadedAt),
+          },
+        })),
+      };
+    } catch (error: any) {
+      this.resetIfMissing(error);
+      console.warn(`Semantic cache lookup failed: ${error?.message || error}`);
+      return null;
+    }
+  }
+
+  /**
+   * Lưu response vào cache, key theo query embedding
+   */
+  async store(
+    queryVector: number[],
+    question: string,
+    topK: number,
+    response: CachedResponse
+  ): Promise<void> {
+    if (!this.enabled) {
+      return;
+    }
+
+    try {
+      await this.ensureCollection(queryVector.length);
+
+      await this.client.upsert(this.collectionName, {
+        wait: false,
+        points: [
+          {
+            id: toPointId(`${topK}:${question}`),
+            vector: queryVector,
+            payload: {
+              question,
+              topK,
+              answer: response.answer,
+              sources: JSON.parse(JSON.stringify(response.sources)),
+            },
+          },
+        ],
+      });
+    } catch (error: any) {
+      this.resetIfMissing(error);
+      console.warn(`Semantic cache store failed: ${error?.message || error}`);
+    }
+  }
+
+  /**
+   * Xoá toàn bộ cache (gọi khi documents thay đổi)
+   */
+  async clear(): Promise<void> {
+    if (!this.enabled) {
+      return;
+    }
+
+    try {
+      const collections = await this.client.getCollections();
+      const exists = collections.collections.some(
+        (col) => col.name === this.collectionName
+      );
+      if (exists) {
+        await this.client.deleteCollection(this.collectionName);
+      }
+      this.collectionReady = null;
+    } catch (error: any) {
+      console.warn(`Semantic cache clear failed: ${error?.message || error}`);
+    }
+  }
+
+  /**
+   * Collection bị xoá từ bên ngoài (instance khác gọi clear()):
+   * bỏ collectionReady để lần gọi sau tạo lại collection
+   */
+  private resetIfMissing(error: any): void {
+    if (error?.status === 404) {
+      this.collectionReady = null;
+    }
+  }
+
+  /**
+   * Cập nhật hit rate và điều chỉnh threshold sau mỗi ADAPT_WINDOW lookups
+   */
+  private recordLookup(hit: boolean): void {
+    this.windowLookups++;
+    if (hit) {
+      this.windowHits++;
+    }
+
+    if (this.windowLookups < ADAPT_WINDOW) {
+      return;
+    }
+
+    const hitRate = this.windowHits / this.windowLookups;
+    if (hitRate < TARGET_HIT_RATE) {
+      this.threshold = Math.max(this.minThreshold, this.threshold - THRESHOLD_STEP);
+    } else {
+      this.threshold = Math.min(INITIAL_THRESHOLD, this.threshold + THRESHOLD_STEP);
+    }
+    this.windowLookups = 0;
+    this.windowHits = 0;
+  }
+}
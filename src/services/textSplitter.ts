@@ -1,9 +1,14 @@
-import { Document } from './documentLoader';
+import { DocumentMetadata } from './documentLoader';
 import { config } from '../config';
 
+// Char codes của các separators dùng để chọn điểm cắt chunk
+const SPACE = 0x20;
+const PERIOD = 0x2e;
+const NEWLINE = 0x0a;
+
 export interface TextChunk {
   text: string;
-  metadata: Document['metadata'] & {
+  metadata: DocumentMetadata & {
     chunkIndex: number;
     totalChunks: number;
   };
@@ -11,58 +16,94 @@ export interface TextChunk {
 
 export class TextSplitter {
   /**
-   * Chia tài liệu thành chunks với overlap
+   * Chia tài liệu dạng stream thành chunks, chỉ giữ một buffer nhỏ trong RAM.
+   * totalChunks chưa biết trước nên để 0, VectorStore cập nhật sau khi ingest xong.
    */
-  static splitDocument(document: Document): TextChunk[] {
-    const { content, metadata } = document;
+  static async *splitStream(
+    windows: AsyncIterable<string>,
+    metadata: DocumentMetadata
+  ): AsyncGenerator<TextChunk> {
     const chunkSize = config.document.chunkSize;
-    const chunkOverlap = config.document.chunkOverlap;
 
-    const chunks: TextChunk[] = [];
+    let buffer = '';
     let startIndex = 0;
+    let chunkIndex = 0;
 
-    while (startIndex < content.length) {
-      const endIndex = Math.min(startIndex + chunkSize, content.length);
-      let chunkText = content.slice(startIndex, endIndex);
+    for await (const window of windows) {
+      // Bỏ khoảng trắng đầu tài liệu
+      const text = buffer.length === 0 && chunkIndex === 0 ? window.trimStart() : window;
+      buffer = buffer.slice(startIndex) + text;
+      startIndex = 0;
 
-      // Nếu không phải chunk cuối, cố gắng cắt tại khoảng trắng hoặc dấu câu
-      if (endIndex < content.length) {
-        const lastSpace = chunkText.lastIndexOf(' ');
-        const lastPeriod = chunkText.lastIndexOf('.');
-        const lastNewline = chunkText.lastIndexOf('\n');
-        
-        const cutIndex = Math.max(lastNewline, lastPeriod, lastSpace);
-        if (cutIndex > chunkSize * 0.5) {
-          chunkText = chunkText.slice(0, cutIndex + 1);
-          startIndex += cutIndex + 1;
-        } else {
-          startIndex = endIndex;
-        }
-      } else {
-        startIndex = endIndex;
+      // Chỉ cắt khi chắc chắn còn content phía sau chunk; khoảng trắng cuối buffer
+      // có thể là cuối tài liệu (sẽ bị trim) nên không tính là content
+      const contentLength = buffer.trimEnd().length;
+      while (contentLength - startIndex > chunkSize) {
+        const { text: chunkText, nextIndex } = this.nextChunk(buffer, startIndex);
+        yield this.createChunk(chunkText, metadata, chunkIndex++);
+        startIndex = nextIndex;
       }
+    }
 
-      chunks.push({
-        text: chunkText.trim(),
-        metadata: {
-          ...metadata,
-          chunkIndex: chunks.length,
-          totalChunks: 0, // Sẽ được cập nhật sau
-        },
-      });
+    const rest = buffer.slice(startIndex).trimEnd();
+    startIndex = 0;
+    while (startIndex < rest.length) {
+      const { text: chunkText, nextIndex } = this.nextChunk(rest, startIndex);
+      yield this.createChunk(chunkText, metadata, chunkIndex++);
+      startIndex = nextIndex;
+    }
+  }
 
-      // Áp dụng overlap
-      if (startIndex < content.length) {
-        startIndex = Math.max(0, startIndex - chunkOverlap);
+  /**
+   * Lấy chunk bắt đầu tại startIndex và vị trí bắt đầu của chunk tiếp theo (đã tính overlap)
+   */
+  private static nextChunk(
+    content: string,
+    startIndex: number
+  ): { text: string; nextIndex: number } {
+    const chunkSize = config.document.chunkSize;
+    const chunkOverlap = config.document.chunkOverlap;
+
+    let endIndex = Math.min(startIndex + chunkSize, content.length);
+
+    // Nếu không phải chunk cuối, cố gắng cắt tại khoảng trắng hoặc dấu câu:
+    // quét ngược một lần từ cuối chunk, dừng ở separator đầu tiên gặp được
+    // hoặc khi điểm cắt không còn nằm trong nửa sau của chunk
+    if (endIndex < content.length) {
+      const minCutIndex = startIndex + chunkSize * 0.5;
+      for (let i = endIndex - 1; i > minCutIndex; i--) {
+        const code = content.charCodeAt(i);
+        if (code === SPACE || code === PERIOD || code === NEWLINE) {
+          endIndex = i + 1;
+          break;
+        }
       }
     }
 
-    // Cập nhật totalChunks
-    chunks.forEach((chunk) => {
-      chunk.metadata.totalChunks = chunks.length;
-    });
+    const chunkText = content.slice(startIndex, endIndex);
+    let nextIndex = endIndex;
+
+    // Áp dụng overlap
+    if (nextIndex < content.length) {
+      nextIndex = Math.max(0, nextIndex - chunkOverlap);
+    }
+
+    return { text: chunkText, nextIndex };
+  }
 
-    return chunks;
+  private static createChunk(
+    text: string,
+    metadata: DocumentMetadata,
+    chunkIndex: number
+  ): TextChunk {
+    return {
+      text: text.trim(),
+      metadata: {
+        ...metadata,
+        chunkIndex,
+        totalChunks: 0, // Sẽ được cập nhật sau
+      },
+    };
   }
 }
 
@@ -2,6 +2,20 @@ import { QdrantClient } from '@qdrant/js-client-rest';
 import { config } from '../config';
 import { TextChunk } from './textSplitter';
 import { Embedder } from './embedder';
+import { toPointId } from '../utils/pointId';
+import { batched } from '../utils/iterables';
+import { AsyncQueue } from '../utils/asyncQueue';
+
+// int8 scalar quantization, giữ quantized vectors trong RAM
+const SCALAR_QUANTIZATION = {
+  scalar: {
+    type: 'int8' as const,
+    always_ram: true,
+  },
+};
+
+// Số batches tối đa chờ giữa các stages của ingestion pipeline
+const PIPELINE_QUEUE_SIZE = 4;
 
 export interface SearchResult {
   text: string;
@@ -14,11 +28,8 @@ export class VectorStore {
   private collectionName: string;
   private embedder: Embedder;
 
-  constructor() {
-    this.client = new QdrantClient({
-      url: config.qdrant.url,
-      apiKey: config.qdrant.apiKey,
-    });
+  constructor(client: QdrantClient) {
+    this.client = client;
     this.collectionName = config.collection.name;
     this.embedder = new Embedder();
   }
@@ -35,12 +46,7 @@ export class VectorStore {
 
       if (!exists) {
         const vectorSize = this.embedder.getDimension();
-        await this.client.createCollection(this.collectionName, {
-          vectors: {
-            size: vectorSize,
-            distance: 'Cosine',
-          },
-        });
+        await this.createCollection(vectorSize);
         console.log(`Collection "${this.collectionName}" has been created with dimension ${vectorSize}`);
       } else {
         // Check if collection dimension matches
@@ -56,13 +62,22 @@ export class VectorStore {
           await this.client.deleteCollection(this.collectionName);
           
           // Recreate with correct dimension
-          await this.client.createCollection(this.collectionName, {
-            vectors: {
-              size: expectedSize,
-              distance: 'Cosine',
-            },
-          });
+          await this.createCollection(expectedSize);
           console.log(`Collection "${this.collectionName}" has been recreated with dimension ${expectedSize}`);
+        } else {
+          if (!collectionInfo.config?.quantization_config) {
+            // Collection cũ chưa có quantization: bật thêm, không cần tạo lại
+            await this.client.updateCollection(this.collectionName, {
+              quantization_config: SCALAR_QUANTIZATION,
+            });
+            console.log(`Enabled int8 scalar quantization on collection "${this.collectionName}"`);
+          }
+
+          if (!collectionInfo.payload_schema?.filepath) {
+            // Collection cũ chưa có filepath index
+            await this.createFilepathIndex();
+            console.log(`Created filepath payload index on collection "${this.collectionName}"`);
+          }
         }
       }
     } catch (error: any) {
@@ -76,58 +91,131 @@ export class VectorStore {
     }
   }
 
+  /**
+   * Tạo collection với int8 scalar quantization:
+   * vectors đã quantize nằm trong RAM cho bước ANN search,
+   * vectors gốc (float32) lưu trên disk chỉ dùng để rescore
+   */
+  private async createCollection(vectorSize: number): Promise<void> {
+    await this.client.createCollection(this.collectionName, {
+      vectors: {
+        size: vectorSize,
+        // Embedder trả về vectors đã chuẩn hoá, Dot cho kết quả như Cosine
+        // nhưng Qdrant không phải chuẩn hoá lại khi search
+        distance: 'Dot',
+        on_disk: true,
+      },
+      quantization_config: SCALAR_QUANTIZATION,
+    });
+
+    await this.createFilepathIndex();
+  }
+
+  /**
+   * Index filepath để update/xoá payload theo document không phải scan toàn collection
+   */
+  private async createFilepathIndex(): Promise<void> {
+    await this.client.createPayloadIndex(this.collectionName, {
+      wait: true,
+      field_name: 'filepath',
+      field_schema: 'keyword',
+    });
+  }
+
   /**
    * Thêm documents vào vector store
    */
-  async addDocuments(chunks: TextChunk[]): Promise<void> {
+  async addDocuments(chunks: AsyncIterable<TextChunk> | Iterable<TextChunk>): Promise<number> {
     let embeddings: number[][] = [];
     let points: any[] = [];
     
     try {
       await this.createCollectionIfNotExists();
 
-      // Tạo embeddings cho tất cả chunks
-      const texts = chunks.map((chunk) => chunk.text);
-      embeddings = await this.embedder.embedTexts(texts);
+      const batchSize = config.qdrant.upsertBatchSize;
+      const chunkCounts = new Map<string, number>();
 
-      // Prepare points for Qdrant
-      // Qdrant accepts string IDs, but we'll use a hash-based approach for uniqueness
-      points = chunks.map((chunk, index) => {
-        const embedding = embeddings[index];
-        
-        // Validate embedding
-        if (!embedding || !Array.isArray(embedding) || embedding.length !== this.embedder.getDimension()) {
-          throw new Error(`Invalid embedding at index ${index}: expected length ${this.embedder.getDimension()}, got ${embedding?.length || 'null'}`);
+      // Pipeline 3 stages nối bằng bounded queues, để đọc/chia chunks,
+      // tạo embeddings và upsert vào Qdrant chạy chồng lên nhau.
+      // Queue giới hạn số batches nằm trong RAM cùng lúc.
+      const chunkQueue = new AsyncQueue<TextChunk[]>(PIPELINE_QUEUE_SIZE);
+      const pointQueue = new AsyncQueue<any[]>(PIPELINE_QUEUE_SIZE);
+      const abort = (error: unknown) => {
+        chunkQueue.fail(error);
+        pointQueue.fail(error);
+        throw error;
+      };
+
+      const produce = async () => {
+        for await (const batch of batched(chunks, batchSize)) {
+          await chunkQueue.push(batch);
         }
-        
-        // Ensure all payload values are JSON-serializable
-        const payload: any = {
-          text: String(chunk.text),
-          filename: String(chunk.metadata.filename),
-          filepath: String(chunk.metadata.filepath),
-          uploadedAt: chunk.metadata.uploadedAt instanceof Date 
-            ? chunk.metadata.uploadedAt.toISOString() 
-            : String(chunk.metadata.uploadedAt),
-          chunkIndex: Number(chunk.metadata.chunkIndex),
-          totalChunks: Number(chunk.metadata.totalChunks),
-        };
-        
-        return {
-          id: this.generatePointId(chunk.metadata),
-          vector: embedding,
-          payload: payload,
-        };
-      });
-      
-      console.log(`Prepared ${points.length} points for upsert, first point ID: ${points[0]?.id}, vector size: ${points[0]?.vector?.length}`);
+        chunkQueue.close();
+      };
 
-      // Upsert points
-      await this.client.upsert(this.collectionName, {
-        wait: true,
-        points: points,
-      });
+      const embed = async () => {
+        for await (const batch of chunkQueue) {
+          embeddings = await this.embedder.embedTexts(batch.map((chunk) => chunk.text));
+          const batchPoints = this.buildPoints(batch, embeddings);
+
+          batch.forEach((chunk) => {
+            const filepath = chunk.metadata.filepath;
+            chunkCounts.set(filepath, (chunkCounts.get(filepath) || 0) + 1);
+          });
+
+          await pointQueue.push(batchPoints);
+        }
+        pointQueue.close();
+      };
+
+      const upload = async () => {
+        for await (const batchPoints of pointQueue) {
+          points = batchPoints;
+          await this.client.upsert(this.collectionName, {
+            wait: false,
+            points: batchPoints,
+          });
+        }
+      };
+
+      try {
+        // Chờ mọi stages dừng hẳn (kể cả upsert đang chạy dở) trước khi xử lý lỗi
+        const stages = await Promise.allSettled([
+          produce().catch(abort),
+          embed().catch(abort),
+          upload().catch(abort),
+        ]);
+        const failed = stages.find((stage) => stage.status === 'rejected');
+        if (failed) {
+          throw (failed as PromiseRejectedResult).reason;
+        }
+
+        // Cập nhật totalChunks (chưa biết trước khi chunk dạng stream).
+        // Qdrant xử lý updates theo thứ tự, nên chờ bước này xong
+        // nghĩa là tất cả batches phía trên cũng đã được apply.
+        for (const [filepath, count] of chunkCounts) {
+          await this.client.setPayload(this.collectionName, {
+            wait: true,
+            payload: { totalChunks: count },
+            filter: {
+              must: [{ key: 'filepath', match: { value: filepath } }],
+            },
+          });
+        }
+      } catch (error) {
+        // Ingest thất bại giữa chừng: xoá các batches đã upsert,
+        // để chat không retrieve chunks của document chưa ingest xong
+        await this.deleteDocuments([...chunkCounts.keys()]);
+        throw error;
+      }
+
+      let totalCount = 0;
+      for (const count of chunkCounts.values()) {
+        totalCount += count;
+      }
 
-      console.log(`Added ${points.length} chunks to vector store`);
+      console.log(`Added ${totalCount} chunks to vector store in batches of ${batchSize}`);
+      return totalCount;
     } catch (error: any) {
       const errorMessage = error?.message || String(error);
       let errorDetails: any = '';
@@ -168,21 +256,109 @@ export class VectorStore {
   }
 
   /**
-   * Tìm kiếm similar documents
+   * Xoá tất cả chunks của các documents theo filepath.
+   * Lỗi chỉ được log, để không che mất lỗi gốc của caller.
+   */
+  private async deleteDocuments(filepaths: string[]): Promise<void> {
+    for (const filepath of filepaths) {
+      try {
+        await this.client.delete(this.collectionName, {
+          wait: true,
+          filter: {
+            must: [{ key: 'filepath', match: { value: filepath } }],
+          },
+        });
+        console.log(`Removed partially ingested chunks of ${filepath}`);
+      } catch (error: any) {
+        console.error(`Error removing chunks of ${filepath}: ${error?.message || error}`);
+      }
+    }
+  }
+
+  /**
+   * Prepare points cho Qdrant từ chunks và embeddings tương ứng
+   */
+  private buildPoints(chunks: TextChunk[], embeddings: number[][]): any[] {
+    return chunks.map((chunk, index) => {
+      const embedding = embeddings[index];
+      
+      // Validate embedding
+      if (!embedding || !Array.isArray(embedding) || embedding.length !== this.embedder.getDimension()) {
+        throw new Error(`Invalid embedding at index ${index}: expected length ${this.embedder.getDimension()}, got ${embedding?.length || 'null'}`);
+      }
+      
+      // Ensure all payload values are JSON-serializable
+      const payload: any = {
+        text: String(chunk.text),
+        filename: String(chunk.metadata.filename),
+        filepath: String(chunk.metadata.filepath),
+        uploadedAt: chunk.metadata.uploadedAt instanceof Date 
+          ? chunk.metadata.uploadedAt.toISOString() 
+          : String(chunk.metadata.uploadedAt),
+        chunkIndex: Number(chunk.metadata.chunkIndex),
+        totalChunks: Number(chunk.metadata.totalChunks),
+      };
+      
+      return {
+        id: this.generatePointId(chunk.metadata),
+        vector: embedding,
+        payload: payload,
+      };
+    });
+  }
+
+  /**
+   * Tìm kiếm similar documents.
+   * Truyền queryVector nếu đã có embedding của query để bỏ qua bước embed.
    */
   async searchSimilar(
     query: string,
-    limit: number = 5
+    limit: number = 5,
+    queryVector?: number[]
   ): Promise<SearchResult[]> {
     try {
-      // Tạo embedding cho query
-      const queryEmbedding = await this.embedder.embedText(query);
+      // Tạo embedding cho query nếu chưa có
+      const queryEmbedding = queryVector ?? await this.embedder.embedText(query);
 
+      return await this.searchByVector(queryEmbedding, limit);
+    } catch (error) {
+      throw new Error(`Error searching: ${error}`);
+    }
+  }
+
+  /**
+   * Tạo embedding cho một query
+   */
+  async embedQuery(query: string): Promise<number[]> {
+    return this.embedder.embedText(query);
+  }
+
+  /**
+   * Tạo embeddings cho nhiều queries
+   */
+  async embedQueries(queries: string[]): Promise<number[][]> {
+    return this.embedder.embedTexts(queries);
+  }
+
+  /**
+   * Tìm kiếm similar documents bằng query vector đã có sẵn
+   */
+  async searchByVector(
+    vector: number[],
+    limit: number = 5
+  ): Promise<SearchResult[]> {
+    try {
       // Search trong Qdrant
       const searchResults = await this.client.search(this.collectionName, {
-        vector: queryEmbedding,
+        vector: vector,
         limit: limit,
         with_payload: true,
+        params: {
+          quantization: {
+            rescore: true,
+            oversampling: 2.0,
+          },
+        },
       });
 
       return searchResults.map((result) => ({
@@ -203,22 +379,9 @@ export class VectorStore {
 
   /**
    * Generate unique point ID từ metadata
-   * Qdrant only accepts unsigned integers or UUIDs, so we'll use a hash-based numeric ID
    */
-  private generatePointId(metadata: TextChunk['metadata']): number {
-    // Create a hash from filename and chunkIndex to generate a unique numeric ID
-    const idString = `${metadata.filename}_${metadata.chunkIndex}`;
-    
-    // Simple hash function to convert string to number
-    let hash = 0;
-    for (let i = 0; i < idString.length; i++) {
-      const char = idString.charCodeAt(i);
-      hash = ((hash << 5) - hash) + char;
-      hash = hash & hash; // Convert to 32-bit integer
-    }
-    
-    // Ensure positive number (unsigned integer)
-    return Math.abs(hash);
+  private generatePointId(metadata: TextChunk['metadata']): string {
+    return toPointId(`${metadata.filename}_${metadata.chunkIndex}`);
   }
 
   /**
@@ -0,0 +1,79 @@
+/**
+ * Bounded async queue nối các stages của một pipeline producer/consumer.
+ * push() chờ khi queue đầy, consumer đọc bằng `for await` cho tới khi queue được close().
+ * fail() huỷ queue: mọi push/đọc đang chờ hoặc sau đó đều throw lỗi đó.
+ */
+export class AsyncQueue<T> {
+  private capacity: number;
+  private items: T[] = [];
+  private closed: boolean = false;
+  private error: unknown = null;
+  private waiters: Array<() => void> = [];
+
+  constructor(capacity: number) {
+    this.capacity = Math.max(1, capacity);
+  }
+
+  /**
+   * Thêm item, chờ nếu queue đang đầy
+   */
+  async push(item: T): Promise<void> {
+    while (this.items.length >= this.capacity && !this.closed) {
+      await this.wait();
+    }
+    if (this.error) {
+      throw this.error;
+    }
+    if (this.closed) {
+      throw new Error('Cannot push to a closed queue');
+    }
+    this.items.push(item);
+    this.wake();
+  }
+
+  /**
+   * Đánh dấu không còn item mới, consumer sẽ dừng sau khi đọc hết
+   */
+  close(): void {
+    this.closed = true;
+    this.wake();
+  }
+
+  /**
+   * Huỷ queue với lỗi
+   */
+  fail(error: unknown): void {
+    if (!this.error) {
+      this.error = error;
+    }
+    this.items = [];
+    this.close();
+  }
+
+  async *[Symbol.asyncIterator](): AsyncGenerator<T> {
+    while (true) {
+      if (this.error) {
+        throw this.error;
+      }
+      if (this.items.length > 0) {
+        const item = this.items.shift() as T;
+        this.wake();
+        yield item;
+      } else if (this.closed) {
+        return;
+      } else {
+        await this.wait();
+      }
+    }
+  }
+
+  private wait(): Promise<void> {
+    return new Promise((resolve) => this.waiters.push(resolve));
+  }
+
+  private wake(): void {
+    const waiters = this.waiters;
+    this.waiters = [];
+    waiters.forEach((resolve) => resolve());
+  }
+}
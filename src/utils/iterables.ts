@@ -0,0 +1,19 @@
+/**
+ * Gom items từ một (async) iterable thành các batches có kích thước tối đa `size`
+ */
+export async function* batched<T>(
+  items: AsyncIterable<T> | Iterable<T>,
+  size: number
+): AsyncGenerator<T[]> {
+  let batch: T[] = [];
+  for await (const item of items) {
+    batch.push(item);
+    if (batch.length >= size) {
+      yield batch;
+      batch = [];
+    }
+  }
+  if (batch.length > 0) {
+    yield batch;
+  }
+}
@@ -0,0 +1,11 @@
+import { createHash } from 'crypto';
+
+/**
+ * Tạo Qdrant point ID từ một key.
+ * Qdrant chỉ nhận unsigned integer hoặc UUID; number của JS không giữ được 64-bit,
+ * nên dùng full 128-bit hash format thành UUID.
+ */
+export function toPointId(key: string): string {
+  const hex = createHash('md5').update(key).digest('hex');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20, 32)}`;
+}
@@ -0,0 +1,58 @@
+/**
+ * Cosine similarity giữa hai vectors
+ */
+export function cosineSimilarity(a: number[], b: number[]): number {
+  let dot = 0;
+  let normA = 0;
+  let normB = 0;
+  for (let i = 0; i < a.length; i++) {
+    dot += a[i] * b[i];
+    normA += a[i] * a[i];
+    normB += b[i] * b[i];
+  }
+  if (normA === 0 || normB === 0) {
+    return 0;
+  }
+  return dot / (Math.sqrt(normA) * Math.sqrt(normB));
+}
+
+/**
+ * Cosine similarity nhỏ nhất giữa mọi cặp vectors
+ */
+export function minPairwiseCosine(vectors: number[][]): number {
+  let min = 1;
+  for (let i = 0; i < vectors.length; i++) {
+    for (let j = i + 1; j < vectors.length; j++) {
+      min = Math.min(min, cosineSimilarity(vectors[i], vectors[j]));
+    }
+  }
+  return min;
+}
+
+/**
+ * Trung bình cộng theo từng chiều của các vectors
+ */
+export function meanVector(vectors: number[][]): number[] {
+  const mean = new Array(vectors[0].length).fill(0);
+  for (const vector of vectors) {
+    for (let i = 0; i < vector.length; i++) {
+      mean[i] += vector[i];
+    }
+  }
+  return mean.map((value) => value / vectors.length);
+}
+
+/**
+ * Chuẩn hoá vector về độ dài 1 (L2), để dot product bằng cosine similarity
+ */
+export function normalize(vector: number[]): number[] {
+  let norm = 0;
+  for (const value of vector) {
+    norm += value * value;
+  }
+  norm = Math.sqrt(norm);
+  if (norm === 0) {
+    return vector;
+  }
+  return vector.map((value) => value / norm);
+}